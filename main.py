@@ -2,22 +2,70 @@ import src.obsRecording as obsRecording
 import src.popUp as popUp
 import yaml
 import asyncio
+import functools
+import os
+import pickle
+import sys
+
+try:
+    from yaml import CSafeLoader as _Loader
+except ImportError:
+    from yaml import SafeLoader as _Loader
+
+# Bump when the values stored in the config cache change, so older cache files are parsed again
+CONFIG_CACHE_VERSION = 1
+
+@functools.lru_cache(maxsize=8)
+def _load_config(config_file, mtime_ns):
+    """Returns the config values of `config_file`, memoized on its absolute path and mtime."""
+    # Reuse the parsed values from the previous run while config.yaml is unchanged
+    cache_file = config_file + '.pkl'
+    try:
+        with open(cache_file, 'rb') as file:
+            cache = pickle.load(file)
+        if cache.get('version') == CONFIG_CACHE_VERSION and cache.get('mtime_ns') == mtime_ns:
+            return cache['values']
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        # Unpickling a damaged or foreign cache can raise nearly anything, and the cache is only a missed shortcut
+        print(f"Warning: Ignoring unreadable config cache '{cache_file}': {e}")
+
+    with open(config_file, 'r') as file:
+        args = yaml.load(file, Loader=_Loader)
+    values = {
+        'obs_host': args['obs_connection']['obs_host'],
+        'obs_port': args['obs_connection']['obs_port'],
+        'obs_password': args['obs_connection']['obs_password'],
+        'buffer_folder': args['paths']['buffer_folder'],
+        'save_folder': args['paths']['save_folder'],
+        'target_host': args['target_machine']['ip'],
+        'target_port': args['target_machine']['port'],
+        'receiver_host': args['receiver_machine']['ip'],
+        'receiver_port': args['receiver_machine']['port'],
+        'python_path': args['python_path'],
+        'receiver_script_path': args['receiver_script_path'],
+    }
+
+    # Write to a temporary file first, so an interrupted write never leaves a truncated cache behind
+    temp_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        with open(temp_file, 'wb') as file:
+            pickle.dump({'version': CONFIG_CACHE_VERSION, 'mtime_ns': mtime_ns, 'values': values}, file)
+        os.replace(temp_file, cache_file)
+    except OSError as e:
+        print(f"Warning: Could not write config cache '{cache_file}': {e}")
+        try:
+            os.remove(temp_file)
+        except OSError:
+            pass
+    return values
 
 class ConfigInfo:
     def __init__(self, config_file):
-        with open(config_file, 'r') as file:
-            args = yaml.safe_load(file)
-            self.obs_host = args['obs_connection']['obs_host']
-            self.obs_port = args['obs_connection']['obs_port']
-            self.obs_password = args['obs_connection']['obs_password']
-            self.buffer_folder = args['paths']['buffer_folder']
-            self.save_folder = args['paths']['save_folder']
-            self.target_host = args['target_machine']['ip']
-            self.target_port = args['target_machine']['port']
-            self.receiver_host = args['receiver_machine']['ip']
-            self.receiver_port = args['receiver_machine']['port']
-            self.python_path = args['python_path']
-            self.receiver_script_path = args['receiver_script_path']
+        config_file = os.path.abspath(config_file)
+        # Copy, so changes to this instance never leak into the memoized values
+        self.__dict__.update(_load_config(config_file, os.stat(config_file).st_mtime_ns))
         
         if not self.__check_values():
             print("Error: Missing values in config file.")
@@ -38,54 +86,86 @@ async def sender_main(args):
     from src.src_sendAndReceive.receiveFiles import AsyncFileReceiver, run_receiver_in_new_terminal
     import websockets
 
-    async def send_message(message):
-        uri = f"ws://{args.target_host}:{args.target_port}"
-        async with websockets.connect(uri) as websocket:
+    # Launch the file receiver in a new terminal
+    run_receiver_in_new_terminal(args.receiver_host, args.receiver_port, args.save_folder, args.receiver_script_path, args.python_path)
+
+    # Reuse one connection for all commands
+    uri = f"ws://{args.target_host}:{args.target_port}"
+    async with websockets.connect(uri) as websocket:
+        async def send_message(message):
             await websocket.send(message)
             print(f"Sent message: {message}")
 
-    # Launch the file receiver in a new terminal
-    run_receiver_in_new_terminal(args.receiver_host, args.receiver_port, args.save_folder, args.receiver_script_path, args.python_path)
+        # Send commands to request the file
+        await send_message("SetName TEST6")
+        await send_message("Start")
+        await asyncio.sleep(4)
+        await send_message("Stop")
+        await send_message(f"SendFilePrevious {args.receiver_host} {args.receiver_port}")
 
-    # Send commands to request the file
-    await send_message("SetName TEST6")
-    await send_message("Start")
-    await asyncio.sleep(4)
-    await send_message("Stop")
-    await send_message(f"SendFilePrevious {args.receiver_host} {args.receiver_port}")
+def local_main(args):
+    """Records a short test video by controlling OBS directly."""
+    import time
 
-if __name__ == '__main__':
-    # # Example usage locally
-    args = ConfigInfo('config.yaml')
+    obs = obsRecording.OBSController(args.obs_host, args.obs_port, args.obs_password, popUp=popUp.PopUp())
+
+    if obs.statusCode == obsRecording.OBSStatus.NOT_CONNECTED or obs.statusCode == obsRecording.OBSStatus.ERROR:
+        print("OBS not connected or turned off. Please check the connection and try again.")
+        exit()
 
-    # obs = obsRecording.OBSController(args.obs_host, args.obs_port, args.obs_password, popUp=popUp.PopUp())
-    
-    # if obs.statusCode == obsRecording.OBSStatus.NOT_CONNECTED or obs.statusCode == obsRecording.OBSStatus.ERROR:
-    #     print("OBS not connected or turned off. Please check the connection and try again.")
-    #     exit()
+    try:
+        # Set save and buffer locations, also set the video name
+        obs.set_save_location(args.save_folder, vid_name="testvid")
+        obs.set_buffer_folder(args.buffer_folder)
 
-    # try:
-    #     # Set save and buffer locations, also set the video name
-    #     obs.set_save_location(args.save_folder, vid_name="testvid")
-    #     obs.set_buffer_folder(args.buffer_folder)
+        # Start recording
+        obs.start_recording()
 
-    #     # Start recording
-    #     obs.start_recording()
+        # Simulate recording duration
+        recordingTime = 5 # 5 seconds
+        print(f"Recording for {recordingTime} seconds...")
+        time.sleep(recordingTime)
 
-    #     # Simulate recording duration
-    #     import time
-    #     recordingTime = 5 # 5 seconds
-    #     print(f"Recording for {recordingTime} seconds...")
-    #     time.sleep(recordingTime)
+        # Stop recording
+        obs.stop_recording()
 
-    #     # Stop recording
-    #     obs.stop_recording()
+    finally:
+        # Savely disconnect from OBS
+        obs.disconnect()
 
-    # finally:
-    #     # Savely disconnect from OBS
-    #     obs.disconnect()
+def ws_server_main(args):
+    """Opens a WebSocket server to control OBS, on the machine running OBS."""
+    from src.websocketInterface import OBSWebSocketInterface
 
+    ws_interface = OBSWebSocketInterface('0.0.0.0', args.target_port, args.obs_host, args.obs_port, args.obs_password, args.save_folder, args.buffer_folder)
+    ws_interface.start_server()
 
-    # Example usage with WebSocket
-    # Opening a websocket server to control OBS
-    asyncio.run(sender_main(args))
\ No newline at end of file
+def receiver_main(args):
+    """Receives the files sent after a SendFilePrevious command."""
+    from src.src_sendAndReceive.receiveFiles import AsyncFileReceiver
+
+    receiver = AsyncFileReceiver(args.receiver_host, args.receiver_port, args.save_folder)
+    receiver.run()
+
+MODES = {
+    'local': local_main,
+    'ws': ws_server_main,
+    'receiver': receiver_main,
+    'sender': lambda args: asyncio.run(sender_main(args)),
+}
+
+if __name__ == '__main__':
+    # Usage: python main.py [local|ws|receiver|sender] [--verbose], defaults to sender
+    argv = [arg for arg in sys.argv[1:] if arg != '--verbose']
+    verbose = len(argv) < len(sys.argv) - 1
+
+    # Warnings and errors are always shown, --verbose adds the per-file messages (moves, renames, uploads)
+    obsRecording.configure_logging(verbose)
+
+    mode = argv[0] if argv else 'sender'
+    if mode not in MODES:
+        print(f"Error: Unknown mode '{mode}'. Choose one of: {', '.join(MODES)}.")
+        exit()
+
+    args = ConfigInfo('config.yaml')
+    MODES[mode](args)
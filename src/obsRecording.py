@@ -1,14 +1,98 @@
+from __future__ import annotations
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
 from enum import Enum
+from functools import lru_cache, partial
+from datetime import datetime
+import errno
+import logging
 import time
 import os
-import cv2
-import numpy as np
+import shutil
+import socket
+import threading
+from typing import TYPE_CHECKING
+import obsws_python as obs
 import subprocess
-import tempfile
-# import src_sendAndReceive.sendFile as sendFile
-import requests
+# cv2, tempfile and requests are imported where they are used, they are only needed for
+# health checks and uploads and cv2 alone takes a noticeable part of a second to load
+if TYPE_CHECKING:
+    import requests
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # Uploads are then always sent uncompressed
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler, Observer = object, None  # The buffer folder is then scanned on every move
+
+# Per-file messages go through this logger, so they are only formatted when its level is enabled
+log = logging.getLogger("obs")
+# obsws_python logs the connection parameters, password included, at INFO
+logging.getLogger("obsws_python").setLevel(logging.WARNING)
+
+def configure_logging(verbose=False):
+    """Prints the `obs` logger's messages to the console, the per-file ones only when `verbose` is set."""
+    if not log.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(handler)
+        # Keep the messages away from the root logger, which stays at its default WARNING level
+        log.propagate = False
+    log.setLevel(logging.DEBUG if verbose else logging.INFO)
+
+# Maximum number of simultaneous connections kept open to an upload endpoint
+UPLOAD_POOL_SIZE = 6
+# Side-car files worth compressing before upload, video is already compressed
+COMPRESSIBLE_EXTENSIONS = ('.json', '.csv', '.bvh', '.txt')
+
+@lru_cache(maxsize=None)
+def get_multipart_encoder():
+    """Returns requests_toolbelt's `MultipartEncoder`, or None if it isn't installed (looked up once)."""
+    try:
+        from requests_toolbelt.multipart.encoder import MultipartEncoder
+    except ImportError:
+        return None  # Upload bodies are then built in memory by requests
+    return MultipartEncoder
+
+def post_multipart(endpoint: str, files: list, data: dict, headers: dict = None, session: requests.Session = None) -> requests.Response:
+    """
+    Posts a multipart/form-data request. With requests_toolbelt installed the body is streamed
+    from the open files in chunks, instead of requests reading every file into memory first.
+    """
+    import requests
+
+    MultipartEncoder = get_multipart_encoder()
+    if MultipartEncoder is None:
+        return (session or requests).post(endpoint, files=files, data=data, headers=headers)
+
+    fields = [(key, value if isinstance(value, (str, bytes)) else str(value)) for key, value in data.items()]
+    encoder = MultipartEncoder(fields=fields + list(files))
+    headers = {**(headers or {}), "Content-Type": encoder.content_type}
+    return (session or requests).post(endpoint, data=encoder, headers=headers)
 
-def send_file_to_endpoint(endpoint: str, file_path: str, field_name: str = "file", extra_data: dict = None, headers: dict = None) -> requests.Response:
+def post_compressed(endpoint: str, files: list, data: dict, headers: dict = None, session: requests.Session = None) -> requests.Response:
+    """
+    Posts a multipart/form-data request with the whole body zstd-compressed (Content-Encoding: zstd).
+    The body is built in memory, so this is meant for small side-car files, and the server has to
+    decode zstd request bodies.
+    """
+    import requests
+
+    with ExitStack() as stack:
+        if session is None:
+            session = stack.enter_context(requests.Session())
+        prepared = session.prepare_request(requests.Request("POST", endpoint, files=files, data=data, headers=headers))
+        prepared.body = zstandard.ZstdCompressor().compress(prepared.body)
+        prepared.headers["Content-Encoding"] = "zstd"
+        prepared.headers["Content-Length"] = str(len(prepared.body))
+        settings = session.merge_environment_settings(prepared.url, {}, None, None, None)
+        return session.send(prepared, **settings)
+
+def send_file_to_endpoint(endpoint: str, file_path: str, field_name: str = "file", extra_data: dict = None, headers: dict = None, session: requests.Session = None, compress: bool = False, file_name: str = None) -> requests.Response:
     """
     Sends a file to a specified HTTP endpoint using multipart/form-data.
 
@@ -17,10 +101,13 @@ def send_file_to_endpoint(endpoint: str, file_path: str, field_name: str = "file
     :param field_name: The form field name expected by the server for file uploads.
     :param extra_data: Optional dict of additional form fields to include in the POST.
     :param headers: Optional dict of HTTP headers to include (e.g. authentication tokens).
+    :param session: Optional `requests.Session` to reuse its open connections.
+    :param compress: Send side-car files (see `COMPRESSIBLE_EXTENSIONS`) zstd-compressed, if zstandard is installed.
+    :param file_name: Name to upload the file under, defaults to the base name of `file_path`.
     :return: The `requests.Response` object from the server.
     :raises: `requests.HTTPError` if the upload fails (non-2xx status code).
     """
-    print(f"[OBS sender] Sending file '{file_path}' to endpoint '{endpoint}'...")
+    log.debug("[OBS sender] Sending file '%s' to endpoint '%s'...", file_path, endpoint)
     # Verify the file exists
     if not os.path.isfile(file_path):
         raise FileNotFoundError(f"No such file: {file_path}")
@@ -30,16 +117,103 @@ def send_file_to_endpoint(endpoint: str, file_path: str, field_name: str = "file
     
     # Open the file in binary mode and send it
     with open(file_path, "rb") as f:
-        files = {
-            field_name: (os.path.basename(file_path), f)
-        }
+        files = [
+            (field_name, (file_name or os.path.basename(file_path), f))
+        ]
         # Perform the POST
-        resp = requests.post(endpoint, files=files, data=data, headers=headers)
+        if compress and zstandard is not None and file_path.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+            resp = post_compressed(endpoint, files, data, headers, session)
+        else:
+            resp = post_multipart(endpoint, files, data, headers, session)
     
     # Raise an exception for error codes (4xx, 5xx)
     resp.raise_for_status()
     return resp
 
+def send_files_to_endpoint(endpoint: str, file_paths: list, field_name: str = "file", extra_data: dict = None, headers: dict = None, session: requests.Session = None, file_names: list = None) -> requests.Response:
+    """
+    Sends several files to a specified HTTP endpoint in a single multipart/form-data request,
+    all under the same form field name. The server has to accept multiple files per request.
+
+    :param endpoint: The server's upload URL.
+    :param file_paths: Paths to the files to be sent.
+    :param field_name: The form field name expected by the server for file uploads.
+    :param extra_data: Optional dict of additional form fields to include in the POST.
+    :param headers: Optional dict of HTTP headers to include (e.g. authentication tokens).
+    :param session: Optional `requests.Session` to reuse its open connections.
+    :param file_names: Names to upload the files under, defaults to the base names of `file_paths`.
+    :return: The `requests.Response` object from the server.
+    :raises: `requests.HTTPError` if the upload fails (non-2xx status code).
+    """
+    log.debug("[OBS sender] Sending %d files to endpoint '%s'...", len(file_paths), endpoint)
+    for file_path in file_paths:
+        if not os.path.isfile(file_path):
+            raise FileNotFoundError(f"No such file: {file_path}")
+
+    file_names = file_names or [os.path.basename(file_path) for file_path in file_paths]
+    with ExitStack() as stack:
+        files = [
+            (field_name, (file_name, stack.enter_context(open(file_path, "rb"))))
+            for file_path, file_name in zip(file_paths, file_names)
+        ]
+        resp = post_multipart(endpoint, files, extra_data or {}, headers, session)
+
+    resp.raise_for_status()
+    return resp
+
+class BufferWatcher(FileSystemEventHandler):
+    """Keeps track of the files in a folder through filesystem events, so it doesn't have to be rescanned."""
+    def __init__(self, folder):
+        super().__init__()
+        self.folder = folder
+        self.folder_key = os.path.normcase(os.path.abspath(folder))
+        self.files = set()
+        self.lock = threading.Lock()
+        self.failed = False  # Set when an event couldn't be handled, the set may have drifted from the folder
+        self.observer = Observer()
+        self.observer.schedule(self, folder, recursive=False)
+        self.observer.start()
+
+        # Seed after starting the observer, so files created in between are not missed
+        with os.scandir(folder) as it:
+            names = {entry.name for entry in it if entry.is_file(follow_symlinks=False)}
+        with self.lock:
+            self.files |= names
+
+    def dispatch(self, event):
+        # An exception here would end the observer thread and freeze the set, so catch it and rescan instead
+        try:
+            super().dispatch(event)
+        except Exception as e:
+            log.warning("[OBS ERROR] Failed to handle buffer folder event %s: %s", event, e)
+            self.failed = True
+
+    def on_created(self, event):
+        if not event.is_directory:
+            with self.lock:
+                self.files.add(os.path.basename(event.src_path))
+
+    def on_deleted(self, event):
+        with self.lock:
+            self.files.discard(os.path.basename(event.src_path))
+
+    def on_moved(self, event):
+        with self.lock:
+            self.files.discard(os.path.basename(event.src_path))
+            if not event.is_directory and os.path.normcase(os.path.abspath(os.path.dirname(event.dest_path))) == self.folder_key:
+                self.files.add(os.path.basename(event.dest_path))
+
+    def snapshot(self):
+        """Returns the names of the files currently in the folder, or None if the folder has to be scanned instead."""
+        if self.failed or not self.observer.is_alive():
+            return None
+        with self.lock:
+            return list(self.files)
+
+    def stop(self):
+        self.observer.stop()
+        self.observer.join()
+
 class OBSStatus(Enum):
     NOT_CONNECTED = "Not connected to OBS"
     CONNECTED = "Connected to OBS"
@@ -66,13 +240,15 @@ class OBSController:
         self.password = password
         self.popUp = popUp
         self.ws = None  # Initialize the client without parameters
-        self.queued_operations = []
+        self.events = None  # Event client, used to know when OBS has finished a recording
+        self.record_stopped = threading.Event()
+        self.queued_operations = deque()
         self.last_upload_health = True, "Good"  # Health check for last upload
+        self.upload_session = None  # Created on the first upload and kept to reuse its connections
 
         # Internal components
         self.connection_manager = self.ConnectionManager(self)
-        if self.connection_manager.check_connection():
-            self.connection_manager.connect()
+        if self.connection_manager.connect():
             self.recording_controller = self.RecordingController(self)
             self.file_manager = self.FileManagementController(self)
             self.statusCode = OBSStatus.IDLE
@@ -91,11 +267,16 @@ class OBSController:
 
     def disconnect(self):
         self.connection_manager.disconnect()
+        if self.file_manager:
+            self.file_manager.stop_watching_buffer()
+        if self.upload_session is not None:
+            self.upload_session.close()
+            self.upload_session = None
         self.statusCode = OBSStatus.KILL
 
     def pop_all_queued_operations(self):
         while self.queued_operations:
-            self.queued_operations.pop(0)()
+            self.queued_operations.popleft()()
 
     def start_recording(self):
         if self.statusCode != OBSStatus.IDLE:
@@ -145,27 +326,80 @@ class OBSController:
     def set_buffer_folder(self, path):
         self.file_manager.set_buffer_folder(path)
     
-    def upload_last_recordings(self, endpoint, field_name="file", extra_data=None, headers=None):
+    def get_upload_session(self):
+        """Returns the `requests.Session` used for uploads, so connections stay alive between files."""
+        if self.upload_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            self.upload_session = requests.Session()
+            # Block instead of opening throwaway connections when every pooled one is busy,
+            # so each connection's handshake is paid once and then reused
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=UPLOAD_POOL_SIZE, pool_block=True)
+            self.upload_session.mount("http://", adapter)
+            self.upload_session.mount("https://", adapter)
+        return self.upload_session
+
+    def upload_last_recordings(self, endpoint, field_name="file", extra_data=None, headers=None, batch_bytes=None, compress=False, folder=None):
         """
         Uploads the last recorded files to a specified HTTP endpoint using multipart/form-data.
+        By default every file is sent in its own request. If `batch_bytes` is set, files are grouped
+        into requests of up to that many bytes (the endpoint has to accept multiple files per request).
+        If `compress` is set, side-car files sent on their own are zstd-compressed (see `send_file_to_endpoint`).
+        Pass `folder` when uploading in the background, so a new save location set meanwhile isn't picked up.
         """
-        if not self.file_manager.current_using_folder:
+        folder = folder or self.file_manager.current_using_folder
+        if not folder:
             error = "[OBS ERROR] No last used folder set for the recording. Cannot upload recordings."
             print(error)
             self.last_upload_health = False, error
             return False, error
 
-        if not os.path.exists(self.file_manager.current_using_folder):
-            error = f"[OBS ERROR] Last used folder '{self.file_manager.current_using_folder}' does not exist."
+        if not os.path.exists(folder):
+            error = f"[OBS ERROR] Last used folder '{folder}' does not exist."
             print(error)
             self.last_upload_health = False, error
             return False, error
 
-        print(f"[OBS] Uploading last recordings from '{self.file_manager.current_using_folder}' to '{endpoint}'...")
-        for file in os.listdir(self.file_manager.current_using_folder):
-            file_path = os.path.join(self.file_manager.current_using_folder, file)
-            if os.path.isfile(file_path):
-                print(send_file_to_endpoint(endpoint, file_path, field_name, extra_data, headers))
+        print(f"[OBS] Uploading last recordings from '{folder}' to '{endpoint}'...")
+        with os.scandir(folder) as it:
+            entries = [entry for entry in it if entry.is_file(follow_symlinks=False)]
+
+        # Everything but the file is the same for each request, so bind it once up front
+        session = self.get_upload_session()
+        extra_data = {key: value if isinstance(value, (str, bytes)) else str(value) for key, value in (extra_data or {}).items()}
+        if batch_bytes:
+            batches, batch, batch_size = [], [], 0
+            for entry in entries:
+                size = entry.stat().st_size
+                if batch and batch_size + size > batch_bytes:
+                    batches.append(batch)
+                    batch, batch_size = [], 0
+                batch.append(entry)
+                batch_size += size
+            if batch:
+                batches.append(batch)
+
+            post = partial(send_files_to_endpoint, endpoint, field_name=field_name, extra_data=extra_data, headers=headers, session=session)
+            uploads = [partial(post, [entry.path for entry in batch], file_names=[entry.name for entry in batch]) for batch in batches]
+        else:
+            post = partial(send_file_to_endpoint, endpoint, field_name=field_name, extra_data=extra_data, headers=headers, session=session, compress=compress)
+            # The scandir entries already hold the joined path and the name, so nothing is split again per file
+            uploads = [partial(post, entry.path, file_name=entry.name) for entry in entries]
+
+        # Uploads are network bound, so keep up to a full connection pool of them in flight
+        with ThreadPoolExecutor(max_workers=max(1, min(UPLOAD_POOL_SIZE, len(uploads)))) as executor:
+            futures = [executor.submit(upload) for upload in uploads]
+            try:
+                for future in as_completed(futures):
+                    log.debug("[OBS] Upload response: %s", future.result())
+            except Exception as e:
+                for future in futures:
+                    future.cancel()
+                error = f"[OBS ERROR] Upload to '{endpoint}' failed: {e}"
+                print(error)
+                self.last_upload_health = False, error
+                raise
 
         print("[OBS] Upload completed.")
         self.last_upload_health = True, "Good"
@@ -176,32 +410,73 @@ class OBSController:
         """Manages the connection to the OBS WebSocket server."""
         def __init__(self, parent):
             self.parent = parent
+            self.last_check = None  # (time.monotonic(), result) of the last reachability check
 
-        def check_connection(self):
-            import websocket
+        def check_connection(self, max_age=1.0):
+            # Bursts of checks within `max_age` seconds share one probe
+            if self.last_check and time.monotonic() - self.last_check[0] < max_age:
+                return self.last_check[1]
+
+            # A plain TCP connect is enough to tell if the webserver is reachable, no WebSocket handshake needed
             try:
-                ws = websocket.create_connection(f"ws://{self.parent.host}:{self.parent.port}")
-                print("[OBS] Should be able to connect to OBS webserver!")
-                ws.close()
-                return True
-            except Exception as e:
+                with socket.create_connection((self.parent.host, self.parent.port), timeout=1):
+                    print("[OBS] Should be able to connect to OBS webserver!")
+                result = True
+            except OSError as e:
                 print(f"[OBS ERROR] You cannot connect to the OBS webserver: {e}")
-                return False
+                result = False
+            self.last_check = time.monotonic(), result
+            return result
 
         def connect(self):
-            import obsws_python as obs
+            """Connects to OBS, returns whether the connection succeeded."""
+            self.last_check = None
+            # Probe first, when OBS isn't running this reports one line instead of a traceback from each client
+            if not self.check_connection():
+                return False
+
+            connection_args = {"host": self.parent.host, "port": self.parent.port}
+            if self.parent.password:
+                connection_args["password"] = self.parent.password
+
+            # Both clients do their own handshake, so open the event client in the background meanwhile
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                events_future = executor.submit(obs.EventClient, **connection_args)
+                try:
+                    self.parent.ws = obs.ReqClient(**connection_args)
+                    print("[OBS] Connected to OBS WebSocket.")
+                    connected = True
+                except Exception as e:
+                    print(f"[OBS ERROR] Failed to connect to OBS: {e}")
+                    connected = False
+
             try:
-                if self.parent.password:
-                    self.parent.ws = obs.ReqClient(
-                        host=self.parent.host, port=self.parent.port, password=self.parent.password
-                    )
-                else:
-                    self.parent.ws = obs.ReqClient(host=self.parent.host, port=self.parent.port)
-                print("[OBS] Connected to OBS WebSocket.")
+                self.parent.events = events_future.result()
             except Exception as e:
-                print(f"[OBS ERROR] Failed to connect to OBS: {e}")
+                self.parent.events = None
+                if connected:
+                    print(f"[OBS ERROR] Failed to subscribe to OBS events, falling back to a fixed wait after stopping: {e}")
+
+            if not connected:
+                if self.parent.events:
+                    self.parent.events.unsubscribe()
+                    self.parent.events = None
+                return False
+
+            if self.parent.events:
+                self.parent.events.callback.register(self.on_record_state_changed)
+            return True
+
+        def on_record_state_changed(self, data):
+            # Called by obsws_python on the RecordStateChanged event
+            if data.output_state == "OBS_WEBSOCKET_OUTPUT_STOPPED":
+                self.parent.record_stopped.set()
 
         def disconnect(self):
+            self.last_check = None
+            if self.parent.events:
+                self.parent.events.unsubscribe()
+                self.parent.events = None
             if self.parent.ws:
                 self.parent.ws.disconnect()
                 print("[OBS] Disconnected from OBS WebSocket.")
@@ -245,49 +520,69 @@ class OBSController:
                 print("[OBS ERROR] WebSocket connection not established. Cannot stop recording.")
                 return
             try:
+                self.parent.record_stopped.clear()
                 self.parent.ws.stop_record()
                 print("[OBS] Stopped recording.")
-                time.sleep(1)
+                self.wait_until_stopped()
                 self.parent.file_manager.move_recorded_files()
-                time.sleep(1)
-                self.parent.file_manager.prepend_vid_name_last_recordings()
+                files = self.parent.file_manager.prepend_vid_name_last_recordings()
                 self.parent.statusCode = OBSStatus.IDLE
                 # Set last used folder to the current using folder for the health checks
                 self.parent.file_manager.last_used_folder = self.parent.file_manager.current_using_folder
+                self.parent.file_manager.last_used_files = files
                 if self.parent.queued_operations:
                     self.parent.pop_all_queued_operations()
             except Exception as e:
                 print(f"[OBS ERROR] Failed to stop recording: {e}")
 
+        def wait_until_stopped(self, timeout=5):
+            """Wait until OBS reports the recording output as stopped, so the recorded files are finalized."""
+            if not self.parent.events:
+                time.sleep(1)
+                return
+            if not self.parent.record_stopped.wait(timeout):
+                print(f"[OBS ERROR] OBS did not report the recording as stopped within {timeout} seconds.")
+
     class FileManagementController:
         """Manages the recorded files and their storage locations."""
         def __init__(self, parent):
             self.parent = parent
             self.buffer_folder = r"D:\VideoCapture\SourceRecordBuffer"
+            self.buffer_watcher = None  # Tracks the buffer folder contents when watchdog is installed
             self.last_vid_name = None
             self.current_using_folder = None
             self.last_used_root_folder = None
 
             # vars for health check
             self.last_used_folder = None
+            self.last_used_files = None  # File names in last_used_folder when the recording stopped, None if unknown
             self.sessions_started = False
             self.health_check = True
             self.last_checked_folder = None
             self.error = ""
+            self.health_cache = {}  # video path -> ((st_mtime_ns, st_size), first and last frame same)
+            self.health_cache_folder = None
 
         def set_buffer_folder(self, path):
             """Sets the location to store the recorded files temporarily."""
-            import os
-
-            if not os.path.exists(path):
-                os.makedirs(path, exist_ok=True)
+            os.makedirs(path, exist_ok=True)
             self.buffer_folder = path
             print(f"[OBS] Buffer path set to: {self.buffer_folder}")
 
+            self.stop_watching_buffer()
+            if Observer is not None:
+                try:
+                    self.buffer_watcher = BufferWatcher(path)
+                except Exception as e:
+                    print(f"[OBS ERROR] Failed to watch the buffer folder, it will be scanned instead: {e}")
+
+        def stop_watching_buffer(self):
+            if self.buffer_watcher:
+                self.buffer_watcher.stop()
+                self.buffer_watcher = None
+
         def set_save_location(self, root_folder, vid_name="Recording"):
             """Sets the location to save the recorded files dynamically."""
-            import os
-            from datetime import datetime
 
             if root_folder == None:
                 root_folder = self.last_used_root_folder
@@ -304,9 +599,8 @@ class OBSController:
             self.last_used_root_folder = root_folder
             self.last_vid_name = vid_name
 
-            # Create a date folder under the root folder
+            # Date folder under the root folder, created together with the session folder below
             date_folder = os.path.join(root_folder, datetime.now().strftime("%Y-%m-%d"))
-            os.makedirs(date_folder, exist_ok=True)
 
             # Create a subfolder for each recording with incremental numbers
             session_folder_base = os.path.join(date_folder, vid_name)
@@ -320,18 +614,18 @@ class OBSController:
             print(f"[OBS] Save path set to: {self.current_using_folder}")
 
         def get_incremental_folder(self, base_path):
-            """Finds the next available subfolder number in the given base path."""
-            import os
-            i = 1
-            while os.path.exists(os.path.join(base_path, f"{i}")):
-                i += 1
-            return os.path.join(base_path, f"{i}")
+            """Finds the subfolder number following the highest one in the given base path."""
+            try:
+                with os.scandir(base_path) as it:
+                    # Filter before int() instead of catching ValueError; isdecimal, unlike isdigit,
+                    # rejects names such as '²' that int() cannot parse
+                    used = [int(entry.name) for entry in it if entry.name.isdecimal() and entry.is_dir()]
+            except FileNotFoundError:
+                used = []
+            return os.path.join(base_path, f"{max(used) + 1 if used else 1}")
 
         def move_recorded_files(self, max_retries=6, delay=0.5):
             """Move all files from the buffer to the last used folder."""
-            import os
-            import shutil
-            import time
 
             if not self.current_using_folder:
                 print("[OBS ERROR] No folder set for the recording. Can't move the files.")
@@ -340,25 +634,58 @@ class OBSController:
             self.sessions_started = True
 
             try:
-                for filename in os.listdir(self.buffer_folder):
-                    file_path = os.path.join(self.buffer_folder, filename)
-                    if os.path.isfile(file_path):
-                        destination = os.path.join(self.current_using_folder, filename)
-                        retries = 0
-                        while retries < max_retries:
-                            try:
-                                shutil.move(file_path, destination)
-                                print(f"[OBS] Moved {filename} to {self.current_using_folder}")
-                                break
-                            except PermissionError as e:
-                                print(f"[OBS ERROR] Error moving {filename}: {e}. Retrying in {delay} seconds...")
-                                retries += 1
-                                time.sleep(delay)
-                                if retries == max_retries:
-                                    print(f"[OBS ERROR] Failed to move {filename} after {max_retries} retries.")
+                filenames = self.buffer_watcher.snapshot() if self.buffer_watcher else None
+                if filenames is None:
+                    if self.buffer_watcher:
+                        log.warning("[OBS ERROR] Buffer folder watcher stopped tracking, scanning the folder instead.")
+                    with os.scandir(self.buffer_folder) as it:
+                        filenames = [entry.name for entry in it if entry.is_file(follow_symlinks=False)]
+
+                folder = self.current_using_folder
+                # Make sure the session folder still exists, so every move can be a plain rename into it
+                os.makedirs(folder, exist_ok=True)
+                if filenames and os.stat(self.buffer_folder).st_dev != os.stat(folder).st_dev:
+                    # Across drives every move is a full copy, so overlap them. On the same drive a move
+                    # is a single rename and a thread pool would only add overhead.
+                    with ThreadPoolExecutor(max_workers=4) as executor:
+                        list(executor.map(lambda filename: self.move_entry(filename, folder, max_retries, delay), filenames))
+                else:
+                    for filename in filenames:
+                        self.move_entry(filename, folder, max_retries, delay)
             except Exception as e:
                 print(f"[OBS ERROR] Failed to move the files: {e}")
 
+        def move_entry(self, filename, folder, max_retries, delay):
+            """Move a single file from the buffer into `folder`, retrying while the file is still locked."""
+            # Plain concatenation is safe here, a doubled separator from a trailing one in the buffer path is harmless
+            file_path = f"{self.buffer_folder}{os.sep}{filename}"
+            destination = f"{folder}{os.sep}{filename}"
+            retries = 0
+            while retries < max_retries:
+                try:
+                    self.move_file(file_path, destination)
+                    log.debug("[OBS] Moved %s to %s", filename, folder)
+                    break
+                except FileNotFoundError:
+                    log.debug("[OBS] %s is no longer in the buffer, skipping it", filename)
+                    break
+                except PermissionError as e:
+                    log.warning("[OBS ERROR] Error moving %s: %s. Retrying in %s seconds...", filename, e, delay)
+                    retries += 1
+                    time.sleep(delay)
+                    if retries == max_retries:
+                        log.error("[OBS ERROR] Failed to move %s after %s retries.", filename, max_retries)
+
+        @staticmethod
+        def move_file(src, dst):
+            """Move a file with a single rename, only copying when src and dst are on different drives."""
+            try:
+                os.replace(src, dst)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                shutil.move(src, dst)
+
         def check_last_used_folder(self):
             """Check if the last used folder exists. Check if it contains any files. Check if the files are not just black screens. On success return True, else return False."""
             # Check if a recording session has been started
@@ -378,35 +705,55 @@ class OBSController:
                 return False, self.error
 
             # Check if the last used folder exists
-            if not os.path.exists(self.last_used_folder):
+            try:
+                with os.scandir(self.last_used_folder) as it:
+                    entries = list(it)
+            except FileNotFoundError:
                 self.error = f"[OBS ERROR] Last used folder '{self.last_used_folder}' does not exist."
                 print(self.error)
                 return False, self.error
 
             # Check if the last used folder contains any files
-            files = os.listdir(self.last_used_folder)
-            if not files:
+            if not entries:
                 self.error = f"[OBS ERROR] Last used folder '{self.last_used_folder}' is empty."
                 return False, self.error
 
-            # Check if the files are not just black screens
-            for file in files:
-                file_path = os.path.join(self.last_used_folder, file)
-                if not os.path.isfile(file_path):
-                    continue
-                
-                # Check if the first frame is the same as the last frame
-                if file.lower().endswith(('.mp4', '.avi', '.mov', '.mkv')):
-                    if self.is_first_last_same(file_path):
-                        self.error = f"[OBS ERROR] Video '{file}' has the same first and last frame."
-                        print(self.error)
-                        return False, self.error
+            # Only remember results for the folder being checked
+            if self.health_cache_folder != self.last_used_folder:
+                self.health_cache = {}
+                self.health_cache_folder = self.last_used_folder
+
+            # Check if the videos are not just black screens, by checking if the first frame is the same as the last frame.
+            # Frame decoding runs in native code, so the videos are checked in parallel.
+            videos = [entry for entry in entries if entry.is_file() and entry.name.lower().endswith(('.mp4', '.avi', '.mov', '.mkv'))]
+            if videos:
+                with ThreadPoolExecutor(max_workers=min(4, len(videos))) as executor:
+                    futures = {executor.submit(self.is_first_last_same_cached, entry): entry for entry in videos}
+                    for future in as_completed(futures):
+                        if future.result():
+                            for pending in futures:
+                                pending.cancel()
+                            self.error = f"[OBS ERROR] Video '{futures[future].name}' has the same first and last frame."
+                            print(self.error)
+                            return False, self.error
 
             self.last_checked_folder = self.last_used_folder
             self.health_check = True
             print(f"[OBS] Last used folder is valid and contains valid files: {self.last_used_folder}")
             return True, "Good"
 
+        def is_first_last_same_cached(self, entry):
+            """Like `is_first_last_same` for a DirEntry, but skips videos that haven't changed since they were last checked."""
+            stat = entry.stat()
+            key = (stat.st_mtime_ns, stat.st_size)
+            cached = self.health_cache.get(entry.path)
+            if cached and cached[0] == key:
+                return cached[1]
+
+            same = self.is_first_last_same(entry.path)
+            self.health_cache[entry.path] = key, same
+            return same
+
         def ffmpeg_extract_frame(self, video_path, time_sec, tmp_png_path):
             """
             Extract a single frame at `time_sec`:
@@ -430,7 +777,55 @@ class OBSController:
             )
             subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
 
-        def is_first_last_same(self, video_path, diff_thresh=1e-6):
+        def read_first_last_frames(self, video_path):
+            """Reads the first and last frame in-process with OpenCV. Returns (None, None) if the video can't be seeked to its end."""
+            import cv2
+
+            capture = cv2.VideoCapture(video_path)
+            try:
+                ok, first = capture.read()
+                frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+                if not ok or frame_count < 1:
+                    return None, None
+
+                capture.set(cv2.CAP_PROP_POS_FRAMES, frame_count - 1)
+                ok, last = capture.read()
+                if not ok:
+                    return None, None
+                return first, last
+            finally:
+                capture.release()
+
+        def av_read_first_last_frames(self, video_path):
+            """Decodes the first and last frame in-process with PyAV, seeking to the last keyframe instead of trusting the frame count."""
+            import av
+
+            with av.open(video_path) as container:
+                stream = container.streams.video[0]
+                first = next(container.decode(stream), None)
+                if first is None:
+                    return None, None
+
+                if stream.duration is not None:
+                    container.seek((stream.start_time or 0) + stream.duration, stream=stream)
+                elif container.duration is not None:
+                    container.seek(container.duration)
+                else:
+                    return None, None
+
+                # The seek lands on the keyframe before the end, so decode on to the last frame
+                last = None
+                for last in container.decode(stream):
+                    pass
+                if last is None:
+                    return None, None
+                return first.to_ndarray(format="bgr24"), last.to_ndarray(format="bgr24")
+
+        def ffmpeg_extract_first_last_frames(self, video_path):
+            """Extracts the first and last frame with ffmpeg through two temporary PNG files."""
+            import cv2
+            import tempfile
+
             # Create two temp PNG paths
             fd1, png1 = tempfile.mkstemp(suffix=".png"); os.close(fd1)
             fd2, png2 = tempfile.mkstemp(suffix=".png"); os.close(fd2)
@@ -440,24 +835,36 @@ class OBSController:
                 self.ffmpeg_extract_frame(video_path, 0.0, png1)
                 # 2) Grab exactly the last frame (0.1s from the end)
                 self.ffmpeg_extract_frame(video_path, -0.1, png2)
-
-                # Load & convert to grayscale
-                g1 = cv2.cvtColor(cv2.imread(png1), cv2.COLOR_BGR2GRAY)
-                g2 = cv2.cvtColor(cv2.imread(png2), cv2.COLOR_BGR2GRAY)
-
-                # Compute normalized MSE
-                mse = np.mean((g1.astype("float32") - g2.astype("float32")) ** 2)
-                norm_mse = mse / (255.0**2)
-                return norm_mse < diff_thresh
+                return cv2.imread(png1), cv2.imread(png2)
 
             finally:
                 os.remove(png1)
                 os.remove(png2)
 
+        def is_first_last_same(self, video_path, diff_thresh=1e-6):
+            import cv2
+
+            first, last = self.read_first_last_frames(video_path)
+            if first is None:
+                # Some containers report no usable frame count, seek from the end with PyAV if it is installed, else with ffmpeg
+                try:
+                    first, last = self.av_read_first_last_frames(video_path)
+                except ImportError:
+                    first, last = None, None
+                if first is None:
+                    first, last = self.ffmpeg_extract_first_last_frames(video_path)
+
+            # Convert to grayscale
+            g1 = cv2.cvtColor(first, cv2.COLOR_BGR2GRAY)
+            g2 = cv2.cvtColor(last, cv2.COLOR_BGR2GRAY)
+
+            # Compute normalized MSE, summing the squared differences in OpenCV without float32 copies of the frames
+            mse = cv2.norm(g1, g2, cv2.NORM_L2SQR) / g1.size
+            norm_mse = mse / (255.0**2)
+            return norm_mse < diff_thresh
+
         def prepend_vid_name_last_recordings(self, vid_name=None, max_retries=6, delay=0.5):
-            """Prepend the gloss name to the last recorded files."""
-            import os
-            import time
+            """Prepend the gloss name to the last recorded files. Returns the file names afterwards, or None on failure."""
 
             if not self.current_using_folder:
                 print("[OBS ERROR] No folder set for the recording. Can't prepend the gloss name.")
@@ -467,21 +874,40 @@ class OBSController:
                 vid_name = self.last_vid_name
 
             try:
-                for filename in os.listdir(self.current_using_folder):
-                    file_path = os.path.join(self.current_using_folder, filename)
-                    if os.path.isfile(file_path):
-                        new_filename = f"{vid_name}_{filename}"
-                        retries = 0
-                        while retries < max_retries:
-                            try:
-                                os.rename(file_path, os.path.join(self.current_using_folder, new_filename))
-                                print(f"[OBS] Renamed {filename} to {new_filename}")
-                                break
-                            except PermissionError as e:
-                                print(f"[OBS ERROR] Error renaming {filename}: {e}. Retrying in {delay} seconds...")
-                                retries += 1
-                                time.sleep(delay)
-                                if retries == max_retries:
-                                    print(f"[OBS ERROR] Failed to rename {filename} after {max_retries} retries.")
+                # Snapshot the entries first, renaming while scanning could yield renamed files again
+                with os.scandir(self.current_using_folder) as it:
+                    entries = [entry for entry in it if entry.is_file(follow_symlinks=False)]
+
+                # A file still locked by OBS only delays its own rename, not the ones after it
+                folder = self.current_using_folder
+                with ThreadPoolExecutor(max_workers=4) as executor:
+                    return list(executor.map(lambda entry: self.rename_entry(entry, folder, vid_name, max_retries, delay), entries))
             except Exception as e:
                 print(f"[OBS ERROR] Failed to rename the files: {e}")
+                return None
+
+        def rename_entry(self, entry, folder, vid_name, max_retries, delay):
+            """Prepend `vid_name` to a single file in `folder`, retrying while the file is still locked. Returns the file's name afterwards."""
+            filename = entry.name
+            new_filename = f"{vid_name}_{filename}"
+            new_path = f"{folder}{os.sep}{new_filename}"
+            retries = 0
+            while retries < max_retries:
+                try:
+                    # Never overwrite, a reused folder can already hold a recording under the new name.
+                    # os.rename raises FileExistsError on Windows, the check covers POSIX where it would replace.
+                    if os.path.exists(new_path):
+                        raise FileExistsError(errno.EEXIST, "File exists", new_path)
+                    os.rename(entry.path, new_path)
+                    log.debug("[OBS] Renamed %s to %s", filename, new_filename)
+                    return new_filename
+                except FileExistsError:
+                    log.error("[OBS ERROR] Not renaming %s, %s already exists.", filename, new_filename)
+                    return filename
+                except PermissionError as e:
+                    log.warning("[OBS ERROR] Error renaming %s: %s. Retrying in %s seconds...", filename, e, delay)
+                    retries += 1
+                    time.sleep(delay)
+                    if retries == max_retries:
+                        log.error("[OBS ERROR] Failed to rename %s after %s retries.", filename, max_retries)
+            return filename
\ No newline at end of file
@@ -6,8 +6,15 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 import fileManaging
 import subprocess
 import socket
+import struct
 
-def run_receiver_in_new_terminal(host, port, output_folder, receiver_script_path=b'C:\Users\VICON\Desktop\Code\OBSRecorder\OBSRecorder\src\src_sendAndReceive\receiveFiles.py', python_path=b'C:\Users\VICON\.pyenv\pyenv-win\versions\3.10.11\python.exe'):
+CHUNK_SIZE = 1024 * 1024  # Bytes read from the connection at a time
+# File size header preceding every file, must match the one in sendFile.py
+FILE_SIZE_HEADER = struct.Struct("<Q")
+# Kernel socket buffer size for file transfers on Windows, large enough to keep a fast link busy between ACKs
+SOCKET_BUFFER_SIZE = 16 * 1024 * 1024
+
+def run_receiver_in_new_terminal(host, port, output_folder, receiver_script_path=r'C:\Users\VICON\Desktop\Code\OBSRecorder\OBSRecorder\src\src_sendAndReceive\receiveFiles.py', python_path=r'C:\Users\VICON\.pyenv\pyenv-win\versions\3.10.11\python.exe'):
     """Function to launch a separate terminal with the receiver script"""
     def is_port_in_use(host, port):
         """Check if a port is already in use."""
@@ -27,20 +34,17 @@ def run_receiver_in_new_terminal(host, port, output_folder, receiver_script_path
 
     # Adjust the command to run the receiver in a new terminal window (e.g., for Linux/Mac)
     if sys.platform == "win32":
-        # For Windows, use start to open a new command prompt
+        # For Windows, start python directly in its own console window
         subprocess.Popen([
-            "start", 
-            "cmd", 
-            "/K", 
             python_path, 
             receiver_script_path, 
             "--host", host, 
             "--port", str(port), 
             "--output_folder", output_folder
-        ], shell=True)
+        ], creationflags=subprocess.CREATE_NEW_CONSOLE)
     else:
         # For Unix/Linux/MacOS, use gnome-terminal or similar
-        subprocess.Popen(["gnome-terminal", "--", python_path, receiver_script_path, f'--host {host} --port {port} --output_folder {output_folder}', "&"])
+        subprocess.Popen(["gnome-terminal", "--", python_path, receiver_script_path, "--host", host, "--port", str(port), "--output_folder", output_folder])
 
 
 class AsyncFileReceiver:
@@ -49,70 +53,131 @@ class AsyncFileReceiver:
         self.port = port
         self.output_folder = output_folder
 
-        if not os.path.exists(self.output_folder):
-            os.makedirs(self.output_folder)
+        os.makedirs(self.output_folder, exist_ok=True)
 
+        # Bind the port right away and keep it for start_server.
         # If there is already a process running on the specified port, we print a warning and quit.
         try:
-            asyncio.run(self.check_port())
-        except Exception as e:
-            sys.exit()
-
-    async def check_port(self):
-        try:
-            server = await asyncio.start_server(
-                self.receive_file, self.host, self.port
-            )
-            server.close()
-            await server.wait_closed()
-        except OSError as e:
+            self.server = socket.create_server((self.host, self.port))
+        except OSError:
             print(f"Port {self.port} is already in use. Please choose a different port.")
-            raise e
-
-    async def receive_file(self, reader, writer):
+            sys.exit()
+        self.server.setblocking(False)
+        if sys.platform == "win32":
+            # Set on the listening socket, so accepted connections inherit it before the TCP window is negotiated.
+            # Linux autotunes the buffer, and setting it there would disable that and cap it at a doubled rmem_max
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+
+    async def receive_files(self, conn):
+        loop = asyncio.get_running_loop()
         try:
-            # Read the file size (first 10 bytes)
-            file_size_data = await reader.readexactly(10)
-            file_size = int(file_size_data.decode().strip())  # Convert to integer
-
-            # Read the file name (until newline)
-            file_name_data = await reader.readuntil(b"\n")
-            file_name = file_name_data.decode().strip()  # Remove trailing newline
-
-            # Construct the file path
-            take_name = file_name.split("_", 1)[0]
-            date_folder = fileManaging.get_save_location(self.output_folder, take_name)
-            file_path = os.path.join(date_folder, file_name)
-            print(f"Receiving file: {file_name} ({file_size} bytes)...")
-
-            # Read the file contents
-            bytes_received = 0
-            with open(file_path, 'wb') as file:
-                while bytes_received < file_size:
-                    chunk = await reader.read(min(1024, file_size - bytes_received))
-                    if not chunk:
-                        break
-                    file.write(chunk)
-                    bytes_received += len(chunk)
-
-            print(f"Received file: {file_name}")
-
-            # Close connection
-            writer.close()
-            await writer.wait_closed()
+            # The raw socket doesn't get asyncio's stream defaults, so disable Nagle's algorithm here
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            # Every recv lands in this one buffer, instead of allocating a new bytes object per chunk.
+            # The received bytes that aren't handled yet are buffer[start:filled].
+            buffer = bytearray(CHUNK_SIZE)
+            view = memoryview(buffer)
+            start = filled = 0
+
+            # The sender may send several files over the connection, one after another, until it closes it
+            while True:
+                # Read until the file size (8-byte little-endian unsigned integer) and the file name (until newline)
+                # are in, anything received after the newline is already file content
+                while (name_end := buffer.find(b"\n", start + FILE_SIZE_HEADER.size, filled)) == -1:
+                    if start > 0:
+                        # Move the partial header to the front, to make room for the rest of it
+                        buffer[:filled - start] = buffer[start:filled]
+                        start, filled = 0, filled - start
+                    if filled == CHUNK_SIZE:
+                        raise ValueError("File name is too long")
+                    n = await loop.sock_recv_into(conn, view[filled:])
+                    if not n:
+                        if start == filled:
+                            return  # The sender is done
+                        raise ConnectionError("Connection closed before the file name was received")
+                    filled += n
+                file_size, = FILE_SIZE_HEADER.unpack_from(buffer, start)
+                file_name = buffer[start + FILE_SIZE_HEADER.size:name_end].decode().strip()
+                start = name_end + 1
+
+                # Construct the file path
+                take_name = file_name.split("_", 1)[0]
+                date_folder = fileManaging.get_save_location(self.output_folder, take_name)
+                file_path = os.path.join(date_folder, file_name)
+                print(f"Receiving file: {file_name} ({file_size} bytes)...")
+
+                # Read the file contents, writing to disk in the default executor so other transfers keep going.
+                # os.sendfile can't splice socket -> file here, it needs a regular file as its source.
+                bytes_received = 0
+                with open(file_path, 'wb') as file:
+                    # Reserve the full size up front instead of growing the file on every write
+                    if file_size and hasattr(os, "posix_fallocate"):
+                        # Allocates the disk blocks as well, so the filesystem can lay the file out in one go.
+                        # Run it in the executor like the writes, where the filesystem has no native fallocate
+                        # (e.g. exFAT or NFSv3) it is emulated by writing every block.
+                        try:
+                            await loop.run_in_executor(None, os.posix_fallocate, file.fileno(), 0, file_size)
+                        except OSError:
+                            file.truncate(file_size)
+                    else:
+                        # Sets the end of file (SetEndOfFile on Windows)
+                        file.truncate(file_size)
+                    while bytes_received < file_size:
+                        if start == filled:
+                            # Only receive up to the end of this file, the next header is read above
+                            n = await loop.sock_recv_into(conn, view[:min(CHUNK_SIZE, file_size - bytes_received)])
+                            if not n:
+                                break
+                            start, filled = 0, n
+                        chunk = view[start:min(filled, start + file_size - bytes_received)]
+                        # The write is awaited before the buffer is received into again
+                        await loop.run_in_executor(None, file.write, chunk)
+                        bytes_received += len(chunk)
+                        start += len(chunk)
+                    if bytes_received < file_size:
+                        file.truncate(bytes_received)
+
+                if bytes_received < file_size:
+                    raise ConnectionError(f"Connection closed after {bytes_received} of {file_size} bytes of '{file_name}'")
+                print(f"Received file: {file_name}")
 
         except Exception as e:
             print(f"Error receiving file: {e}")
 
+        finally:
+            # Close connection
+            conn.close()
+
     async def start_server(self):
-        server = await asyncio.start_server(
-            self.receive_file, self.host, self.port
-        )
-        addr = server.sockets[0].getsockname()
+        loop = asyncio.get_running_loop()
+        server = self.server
+        addr = server.getsockname()
         print(f"Async server listening on {addr}")
 
-        async with server:
-            await server.serve_forever()
+        # Keep a reference to running transfers, the event loop only holds weak ones
+        transfers = set()
+        with server:
+            while True:
+                conn, _ = await loop.sock_accept(server)
+                conn.setblocking(False)
+                transfer = asyncio.create_task(self.receive_files(conn))
+                transfers.add(transfer)
+                transfer.add_done_callback(transfers.discard)
+
+    def run(self):
+        """Runs the server until it is stopped, on uvloop's libuv event loop when it's installed (it doesn't support Windows)."""
+        if sys.platform != "win32":
+            try:
+                import uvloop
+            except ImportError:
+                pass
+            else:
+                # uvloop.run only exists since uvloop 0.18
+                run = getattr(uvloop, "run", None)
+                if run is not None:
+                    return run(self.start_server())
+        return asyncio.run(self.start_server())
 
 # Example usage
 if __name__ == "__main__":
@@ -130,4 +195,4 @@ if __name__ == "__main__":
     OUTPUT_FOLDER = args.output_folder
 
     receiver = AsyncFileReceiver(HOST, PORT, OUTPUT_FOLDER)
-    asyncio.run(receiver.start_server())  # Run the server
+    receiver.run()  # Run the server
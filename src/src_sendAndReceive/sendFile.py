@@ -1,62 +1,52 @@
+import asyncio
 import socket
 import os
-import requests
+import struct
+import sys
+
+# File size header preceding every file, must match the one in receiveFiles.py
+FILE_SIZE_HEADER = struct.Struct("<Q")
+# Kernel socket buffer size for file transfers on Windows, large enough to keep a fast link busy between ACKs
+SOCKET_BUFFER_SIZE = 16 * 1024 * 1024
+
+async def async_send_files(server_ip, server_port, file_paths):
+    """Sends the files one after another over a single connection, without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    # open_connection resolves host names on every event loop, and disables Nagle's algorithm itself
+    reader, writer = await asyncio.open_connection(server_ip, server_port)
+    if sys.platform == "win32":
+        # The send buffer, unlike the receive buffer, can still be enlarged after connecting.
+        # Linux autotunes it, so it is left alone there
+        writer.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+
+    try:
+        for file_path in file_paths:
+            file_size = os.path.getsize(file_path)
+            file_name = os.path.basename(file_path)
+
+            writer.writelines([FILE_SIZE_HEADER.pack(file_size), f"{file_name}\n".encode()])
+            await writer.drain()
+
+            # Uses os.sendfile (TransmitFile on Windows) where it can, and falls back to chunked writes otherwise
+            sent = 0
+            if file_size:
+                with open(file_path, 'rb') as f:
+                    sent = await loop.sendfile(writer.transport, f, 0, file_size)
+            if sent < file_size:
+                raise IOError(f"File '{file_name}' was truncated while sending")
+
+            print(f"File '{file_name}' ({file_size} bytes) sent successfully!")
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+def send_files(server_ip, server_port, file_paths):
+    """Sends the files one after another over a single connection, for callers without an event loop."""
+    asyncio.run(async_send_files(server_ip, server_port, file_paths))
 
 def send_file(server_ip, server_port, file_path):
-    # Get file details
-    file_size = os.path.getsize(file_path)
-    file_name = os.path.basename(file_path)
+    send_files(server_ip, server_port, [file_path])
 
-    # Create a socket and connect to the server
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.connect((server_ip, server_port))
-
-        # Send file size as a fixed 10-byte string (padded with zeros)
-        s.send(f"{file_size:010d}".encode())
-
-        # Send file name followed by a newline to mark its end
-        s.sendall(f"{file_name}\n".encode())
-
-        # Send file content in chunks
-        with open(file_path, 'rb') as f:
-            while chunk := f.read(1024):
-                s.sendall(chunk)
-
-    print(f"File '{file_name}' ({file_size} bytes) sent successfully!")
-
-
-def send_file_to_endpoint(endpoint: str, file_path: str, field_name: str = "file", extra_data: dict = None, headers: dict = None) -> requests.Response:
-    """
-    Sends a file to a specified HTTP endpoint using multipart/form-data.
-
-    :param endpoint: The server's upload URL.
-    :param file_path: Path to the file to be sent.
-    :param field_name: The form field name expected by the server for file uploads.
-    :param extra_data: Optional dict of additional form fields to include in the POST.
-    :param headers: Optional dict of HTTP headers to include (e.g. authentication tokens).
-    :return: The `requests.Response` object from the server.
-    :raises: `requests.HTTPError` if the upload fails (non-2xx status code).
-    """
-    print(f"[OBS sender] Sending file '{file_path}' to endpoint '{endpoint}'...")
-    # Verify the file exists
-    if not os.path.isfile(file_path):
-        raise FileNotFoundError(f"No such file: {file_path}")
-
-    # Prepare extra form fields
-    data = extra_data or {}
-    
-    # Open the file in binary mode and send it
-    with open(file_path, "rb") as f:
-        files = {
-            field_name: (os.path.basename(file_path), f)
-        }
-        # Perform the POST
-        resp = requests.post(endpoint, files=files, data=data, headers=headers)
-    
-    # Raise an exception for error codes (4xx, 5xx)
-    resp.raise_for_status()
-    return resp
-    
 
 # Example usage
 if __name__ == "__main__":
@@ -5,22 +5,39 @@ import websockets
 from zeroconf import Zeroconf, ServiceInfo
 import socket
 import os
+import functools
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from obsRecording import OBSController
-from src_sendAndReceive.sendFile import send_file
-import yaml
+from obsRecording import OBSController, configure_logging
+from src_sendAndReceive.sendFile import async_send_files
 import logging
 
 import wifiIp
 
 logging.getLogger("websockets").setLevel(logging.CRITICAL)
 
-# Load endpoint configuration from YAML file
-with open('C:\\Users\\VICON\\Desktop\\Code\\recording\\OBSRecorder\\OBSRecorder\\src\\config_endpoint.yaml', 'r') as file:
-    config = yaml.safe_load(file)
-    ENDPOINT = config.get('endpoint', None)
+# Endpoint configuration, read on the first upload rather than on import
+ENDPOINT_CONFIG = 'C:\\Users\\VICON\\Desktop\\Code\\recording\\OBSRecorder\\OBSRecorder\\src\\config_endpoint.yaml'
+
+@functools.lru_cache(maxsize=1)
+def get_endpoint():
+    """Returns the upload endpoint from the endpoint configuration, or None if it isn't configured."""
+    import yaml
+
+    try:
+        with open(ENDPOINT_CONFIG, 'r') as file:
+            config = yaml.safe_load(file)
+    except FileNotFoundError:
+        print(f"[WebSocket] No endpoint configuration found at '{ENDPOINT_CONFIG}', recordings won't be uploaded.")
+        return None
+    return (config or {}).get('endpoint', None)
+
+def list_files(folder):
+    """Returns the paths of the files in `folder`, skipping subfolders."""
+    with os.scandir(folder) as it:
+        return [entry.path for entry in it if entry.is_file()]
 
 BROADCAST_NAME = "OBS.local."  # Use a fixed broadcast name for Zeroconf service discovery
+SEND_CONNECTIONS = 4  # Maximum number of parallel connections used to send the previous recording
 
 class OBSWebSocketInterface:
     """
@@ -53,6 +70,8 @@ class OBSWebSocketInterface:
         self.obs_controller.set_save_location(save_folder)
         self.server = None  # Store server reference
         self.stop_event = asyncio.Event()  # Event to signal shutdown
+        self.upload_tasks = set()  # Uploads running in the background, kept referenced until they finish
+        self.upload_errors = []  # Failed background uploads, kept until a health check reports them
 
         # Zeroconf setup
         self.zeroconf = Zeroconf()
@@ -78,7 +97,6 @@ class OBSWebSocketInterface:
 
 
     async def handler(self, websocket):
-        global ENDPOINT
         async for message in websocket:
             if message == "Start":
                 print("[WebSocket] Received 'Start' message.")
@@ -86,11 +104,19 @@ class OBSWebSocketInterface:
             elif message == "Stop":
                 print("[WebSocket] Received 'Stop' message.")
                 self.obs_controller.stop_recording()
-                if ENDPOINT is not None:
+                endpoint = get_endpoint()
+                if endpoint is not None:
                     print("[WebSocket] Uploading recording to server...")
-                    self.obs_controller.upload_last_recordings(ENDPOINT)
+                    # Upload on a worker thread, so the next take can be set up and started meanwhile
+                    folder = self.obs_controller.file_manager.current_using_folder
+                    task = asyncio.create_task(asyncio.to_thread(self.obs_controller.upload_last_recordings, endpoint, folder=folder))
+                    self.upload_tasks.add(task)
+                    task.add_done_callback(self.upload_done)
             elif message == "Kill":
                 print("[WebSocket] Received 'Kill' message.")
+                if self.upload_tasks:
+                    print("[WebSocket] Waiting for uploads to finish...")
+                    await asyncio.wait(self.upload_tasks)
                 self.obs_controller.disconnect()
                 await asyncio.sleep(2)  # Avoid blocking
                 await websocket.close()
@@ -98,7 +124,7 @@ class OBSWebSocketInterface:
                 return
             elif message == "health":
                 check, result = self.obs_controller.file_manager.check_last_used_folder()
-                check2, result2 = self.obs_controller.last_upload_health
+                check2, result2 = self.upload_health()
                 if check and check2:
                     print("[WebSocket] Last used folder is valid.")
                     await websocket.send("Good")
@@ -110,8 +136,9 @@ class OBSWebSocketInterface:
                         print("[WebSocket] Last upload health check failed.")
                         await websocket.send(str(result2))
             elif message.startswith("SetName"):
-                print(f"[WebSocket] Received 'SetName' message: {message[len('SetName '):]}")
-                self.obs_controller.set_save_location(self.save_folder, message[len("SetName "):])
+                vid_name = message.removeprefix("SetName ")
+                print(f"[WebSocket] Received 'SetName' message: {vid_name}")
+                self.obs_controller.set_save_location(self.save_folder, vid_name)
             elif message.startswith("SendFilePrevious"):
                 print(f"[WebSocket] Received 'SendFilePrevious' message: {message}")
                 host, port = message.split(" ")[1], int(message.split(" ")[2])
@@ -123,11 +150,41 @@ class OBSWebSocketInterface:
                 elif host is None or port is None:
                     print("[WebSocket] Invalid host or port.")
                 else:
-                    for file in os.listdir(last_folder):
-                        send_file(host, port, os.path.join(last_folder, file))
+                    # Use the file names recorded when the recording stopped, only list the folder if they're unknown
+                    files = self.obs_controller.file_manager.last_used_files
+                    if files is None:
+                        paths = await asyncio.to_thread(list_files, last_folder)
+                    else:
+                        paths = [os.path.join(last_folder, file) for file in files]
+                    # Spread the files over a few connections that send in parallel, each one sending its share back to back
+                    groups = [paths[i::SEND_CONNECTIONS] for i in range(min(SEND_CONNECTIONS, len(paths)))]
+                    await asyncio.gather(*(async_send_files(host, port, group) for group in groups))
             else:
                 print(f"[WebSocket] Received unknown message: {message}")
 
+    def upload_done(self, task):
+        self.upload_tasks.discard(task)
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            error = f"[OBS ERROR] Upload failed: {task.exception()}"
+        else:
+            succeeded, error = task.result()
+            if succeeded:
+                return
+        # Recorded per upload, so a later take's successful upload can't hide this failure
+        print(f"[WebSocket] {error}")
+        self.upload_errors.append(error)
+
+    def upload_health(self):
+        """Returns (ok, message) for the background uploads: failures not reported yet first, then whether any still run."""
+        if self.upload_errors:
+            errors, self.upload_errors = self.upload_errors, []
+            return False, "\n".join(errors)
+        if self.upload_tasks:
+            return False, "Upload in progress"
+        return True, "Good"
+
     async def start_server_async(self):
         print(f"[WebSocket] Starting server on {self.server_host}:{self.server_port}")
         self.zeroconf.register_service(self.service_info)
@@ -145,11 +202,11 @@ class OBSWebSocketInterface:
         print("[WebSocket] Server stopped.")
 
     def start_server(self):
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(self.start_server_async())
+        asyncio.run(self.start_server_async())
 
 
 # Example usage
 if __name__ == "__main__":
+    configure_logging()
     ws_interface = OBSWebSocketInterface('0.0.0.0', 8765, 'localhost', 4457, None, 'D:\\VideoCapture\\pineappleRecordings', 'D:\\VideoCapture\\SourceRecordBuffer')
     ws_interface.start_server()
\ No newline at end of file
@@ -1,5 +1,8 @@
+import functools
 import psutil, socket
 
+# The Wi-Fi address rarely changes while running, call get_ip_from_wifi.cache_clear() to look it up again
+@functools.lru_cache(maxsize=1)
 def get_ip_from_wifi():
     names_to_try = ['Wi-Fi', 'wlan0', 'wlp2s0', 'wlan1', 'WiFi']
     for iface_name in names_to_try: